@@ -0,0 +1,99 @@
+# app/batcher.py
+
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .cleaner import MAX_BATCH
+
+class MicroBatcher:
+    """
+    Collects images submitted by concurrent requests and runs them through the model together,
+    so simultaneous small requests share one forward pass instead of each running their own.
+    """
+
+    def __init__(self, process_batch: Callable[[list], list], max_batch: int = MAX_BATCH, max_wait_ms: float = 5.0):
+        """
+        Initializes the MicroBatcher.
+        Args:
+            process_batch (Callable): Blocking function mapping a list of inputs to a list of outputs
+                (e.g. SignatureCleaner.clean_batch). Always runs on the batcher's own worker thread.
+            max_batch (int): Maximum number of items per batch.
+            max_wait_ms (float): How long to wait for more items once the first one arrives.
+        """
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        """Starts the background batching task. Must be called from the running event loop."""
+        # A single dedicated thread: torch.compile's CUDA graphs are captured per thread,
+        # so every batch (and the warmup that captures them) must run on the same one.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background batching task."""
+        if self._worker is not None:
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Runs a blocking function on the batcher's worker thread, e.g. the model's warmup."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        """Waits for one item, then gathers up to max_batch items within max_wait."""
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch:
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        """Background loop: collect a batch, run it off the event loop, and resolve the futures."""
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            # Skip items whose requests have gone away
+            items = [(item, future) for item, future in items if not future.done()]
+            if not items:
+                continue
+
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, [item for item, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
@@ -1,26 +1,75 @@
 # app/cleaner.py
 
 import torch
+import numpy as np
 from PIL import Image
-import torchvision.transforms as transforms
+from torchvision.transforms import v2
 import os
+import threading
 
 # This import works if you copied the 'models' directory from the original repo
 # into your 'app' directory as instructed.
 from .model_files import networks
+from .trt_backend import load_trt_runner
+
+# safetensors is optional; when installed, checkpoints are cached in that format for faster loads.
+try:
+    from safetensors.torch import load_file as load_safetensors, save_file as save_safetensors
+except ImportError:
+    load_safetensors = save_safetensors = None
+
+# Inputs are always 256x256, so let cuDNN benchmark conv algorithms once per shape and
+# cache the winner, and allow TF32 tensor-core math for any FP32 convs/matmuls.
+torch.backends.cudnn.benchmark = True
+torch.backends.cudnn.deterministic = False
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+
+# Largest number of images pushed through the generator in a single forward pass.
+# Bigger requests are split into chunks of this size.
+MAX_BATCH = 16
+
+def load_state_dict(checkpoint_path: str) -> dict:
+    """
+    Loads a generator state dict onto the CPU without unpickling arbitrary objects.
+    The .pth file is memory-mapped; if safetensors is installed, a .safetensors copy is
+    cached next to it on first load and used on subsequent loads.
+    """
+    safetensors_path = os.path.splitext(checkpoint_path)[0] + ".safetensors"
+    if (load_safetensors is not None and os.path.exists(safetensors_path)
+            and os.path.getmtime(safetensors_path) >= os.path.getmtime(checkpoint_path)):
+        return load_safetensors(safetensors_path)
+
+    state_dict = torch.load(checkpoint_path, map_location="cpu", weights_only=True, mmap=True)
+    if save_safetensors is not None:
+        try:
+            save_safetensors(state_dict, safetensors_path)
+        except Exception as e:
+            print(f"WARNING: Could not cache checkpoint as safetensors at {safetensors_path}. Error: {e}")
+    return state_dict
 
 class SignatureCleaner:
     """A class to load the pix2pix model and clean signature images."""
 
-    def __init__(self, checkpoint_path: str, gpu_id: int = -1):
+    def __init__(self, checkpoint_path: str, gpu_id: int = -1,
+                 compile_model: bool = True, compile_mode: str = "reduce-overhead",
+                 use_trt: bool = False, half_precision: bool = True):
         """
         Initializes the SignatureCleaner.
         Args:
             checkpoint_path (str): Path to the trained generator .pth file.
             gpu_id (int): GPU to use. -1 for CPU.
+            compile_model (bool): Wrap the generator with torch.compile when running on GPU.
+            compile_mode (str): Mode passed to torch.compile (e.g. "reduce-overhead", "max-autotune").
+            use_trt (bool): Run inference through a TensorRT FP16 engine when on GPU.
+                Falls back to PyTorch if TensorRT is unavailable or the build fails.
+            half_precision (bool): Cast the generator and its inputs to FP16 when running on GPU.
         """
+        # INT8 TorchScript checkpoints produced by app/quantize.py only run on CPU (FBGEMM).
+        quantized = checkpoint_path.endswith(".pt.int8")
+
         # --- Device Setup ---
-        if gpu_id > -1 and torch.cuda.is_available():
+        if gpu_id > -1 and torch.cuda.is_available() and not quantized:
             self.device = torch.device(f'cuda:{gpu_id}')
             print(f"Using GPU: {gpu_id}")
         else:
@@ -30,44 +79,146 @@ class SignatureCleaner:
         if not os.path.exists(checkpoint_path):
             raise FileNotFoundError(f"Checkpoint file not found at {checkpoint_path}")
 
-        # --- Model Definition ---
-        # These parameters must match the model you trained.
-        # For the default pix2pix model (unet_256):
-        # input_nc=3, output_nc=3, num_downs=8, ngf=64, norm_layer=batch, use_dropout=True
-        self.model = networks.define_G(
-            input_nc=3,
-            output_nc=3,
-            ngf=64,
-            netG='unet_256',
-            norm='batch',
-            use_dropout=True,
-            init_type='normal',
-            init_gain=0.02,
-            gpu_ids=[gpu_id] if gpu_id > -1 else []
-        )
+        if quantized:
+            # --- Load Quantized Model ---
+            # The scripted module already contains the INT8 generator, so define_G is skipped.
+            print(f"Loading INT8 model from {checkpoint_path}")
+            self.model = torch.jit.load(checkpoint_path, map_location=self.device)
+            self.model.eval()
+            # Single-threaded INT8 kernels give the best per-sample latency on x86.
+            torch.set_num_threads(1)
+            print("Model loaded successfully.")
+        else:
+            # --- Model Definition ---
+            # These parameters must match the model you trained.
+            # For the default pix2pix model (unet_256):
+            # input_nc=3, output_nc=3, num_downs=8, ngf=64, norm_layer=batch, use_dropout=True
+            self.model = networks.define_G(
+                input_nc=3,
+                output_nc=3,
+                ngf=64,
+                netG='unet_256',
+                norm='batch',
+                use_dropout=True,
+                init_type='normal',
+                init_gain=0.02,
+                gpu_ids=[gpu_id] if gpu_id > -1 else []
+            )
         
-        # --- Load Weights ---
-        print(f"Loading model from {checkpoint_path}")
-        state_dict = torch.load(checkpoint_path, map_location=self.device)
-        self.model.load_state_dict(state_dict)
-        self.model.eval()  # Set model to evaluation mode
-        print("Model loaded successfully.")
+            # --- Load Weights ---
+            print(f"Loading model from {checkpoint_path}")
+            state_dict = load_state_dict(checkpoint_path)
+            # Adopt the loaded tensors directly instead of copying into the initialized ones
+            self.model.load_state_dict(state_dict, assign=True)
+            self.model.to(self.device)
+            self.model.eval()  # Set model to evaluation mode
+            print("Model loaded successfully.")
+
+        # --- TensorRT Backend ---
+        # Built from the eager model before any compilation; the engine is cached next to the checkpoint.
+        self.trt_runner = None
+        if use_trt and self.device.type == "cuda":
+            try:
+                self.trt_runner = load_trt_runner(self.model, checkpoint_path, self.device, MAX_BATCH)
+                print("TensorRT engine loaded successfully.")
+            except Exception as e:
+                print(f"WARNING: Failed to set up TensorRT backend, using PyTorch. Error: {e}")
+
+        # --- Precision and Memory Format ---
+        # FP16 and NHWC let cuDNN pick its tensor-core convolution kernels; inputs are staged to match.
+        # The TensorRT engine does its own FP16 conversion and takes FP32 inputs.
+        if half_precision and self.device.type == "cuda" and self.trt_runner is None:
+            self.dtype = torch.float16
+            self.model = self.model.half()
+        else:
+            self.dtype = torch.float32
+        if not quantized:
+            self.model = self.model.to(memory_format=torch.channels_last)
+
+        # --- Compilation ---
+        # The generator always sees fixed 256x256 inputs, so compile it once up front.
+        # Compilation itself happens lazily on the first forward pass; call warmup() to trigger it.
+        self.compiled = compile_model and self.device.type == "cuda" and self.trt_runner is None
+        if self.compiled:
+            print(f"Compiling model with torch.compile (mode={compile_mode})...")
+            # Compile the bare generator: with a GPU id, define_G wraps it in DataParallel,
+            # whose per-call scatter/gather Python is exactly the overhead compiling should remove.
+            self.model = torch.compile(getattr(self.model, "module", self.model), mode=compile_mode, fullgraph=False)
 
         # --- Image Transformations ---
         # This transformation pipeline must match the one used during testing in the repo.
-        self.transform = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) # Normalize to [-1, 1]
+        # It runs on uint8 tensors already on the model's device, so resizing happens there too.
+        # Normalization with mean=std=0.5 is just x * 2 - 1, applied in-place to the whole batch in _preprocess.
+        self.transform = v2.Compose([
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Resize((256, 256), interpolation=v2.InterpolationMode.BICUBIC, antialias=True),
         ])
 
-    def _tensor_to_pil(self, tensor_image):
-        """Converts an output tensor to a PIL Image."""
-        # De-normalize from [-1, 1] to [0, 1]
-        image_tensor = tensor_image.detach().cpu().float().squeeze(0)
-        image_tensor = (image_tensor + 1) / 2.0
-        image_tensor = image_tensor.clamp(0, 1)
-        # Convert to PIL Image
-        return transforms.ToPILImage()(image_tensor)
+        # --- Staging Buffers ---
+        # Input/output buffers sized for MAX_BATCH are allocated once and reused for every batch.
+        # On GPU, 256x256 uint8 inputs are staged in a pinned host buffer and uploaded with one async copy,
+        # and the uint8 output comes back through a pinned host buffer the same way.
+        on_gpu = self.device.type == "cuda"
+        self._h_in = torch.empty(MAX_BATCH, 256, 256, 3, dtype=torch.uint8, pin_memory=on_gpu)
+        self._d_in_uint8 = torch.empty(MAX_BATCH, 256, 256, 3, dtype=torch.uint8, device=self.device) if on_gpu else None
+        self._d_in = torch.empty(MAX_BATCH, 3, 256, 256, device=self.device, dtype=self.dtype,
+                                 memory_format=torch.channels_last)
+        self._h_out = torch.empty(MAX_BATCH, 256, 256, 3, dtype=torch.uint8, pin_memory=True) if on_gpu else None
+        # The buffers are shared, so only one batch may run through them at a time. The server's
+        # micro-batcher already runs every batch on one thread; the lock protects direct callers.
+        self._lock = threading.Lock()
+
+    def _tensor_to_uint8(self, tensor_image):
+        """Converts an output tensor (or batch of output tensors) to uint8 HxWx3 pixels on-device."""
+        # De-normalize from [-1, 1] to [0, 255] and cast in one pass, so only uint8 bytes leave the device.
+        # Only the first op allocates, since the model output may be an inference tensor or a reused buffer.
+        image_tensor = tensor_image.detach().add(1).mul_(127.5).clamp_(0, 255).to(torch.uint8)
+        return image_tensor.movedim(-3, -1).contiguous()
+
+    def _preprocess(self, images: list[Image.Image | np.ndarray]) -> torch.Tensor:
+        """
+        Converts up to MAX_BATCH images to a normalized [N, 3, 256, 256] tensor on the model's device.
+        Images may be PIL Images or HxWx3 uint8 arrays.
+        The returned tensor is a view into the input staging buffer.
+        """
+        n = len(images)
+        if all(isinstance(img, np.ndarray) and img.shape == (256, 256, 3) and img.dtype == np.uint8 for img in images):
+            # Already at the model's input size (the server resizes in its decode workers):
+            # stack into the host buffer, upload once, and convert the whole batch in one pass
+            np.stack(images, out=self._h_in[:n].numpy())
+            batch = self._h_in[:n]
+            if self._d_in_uint8 is not None:
+                batch = self._d_in_uint8[:n].copy_(batch, non_blocking=True)
+            self._d_in[:n].copy_(v2.functional.to_dtype(batch.permute(0, 3, 1, 2), torch.float32, scale=True))
+        else:
+            # Upload each image as uint8 at its native size, then resize on-device
+            for i, img in enumerate(images):
+                if isinstance(img, np.ndarray):
+                    image_tensor = torch.from_numpy(img).permute(2, 0, 1)
+                else:
+                    image_tensor = v2.functional.pil_to_tensor(img.convert("RGB"))
+                image_tensor = image_tensor.to(self.device, non_blocking=True)
+                self._d_in[i].copy_(self.transform(image_tensor))
+
+        # Normalize [0, 1] to [-1, 1] in a single in-place pass over the batch
+        return self._d_in[:n].mul_(2.0).sub_(1.0)
+
+    def warmup(self):
+        """
+        Runs dummy batches through the full cleaning path before serving traffic.
+        For a compiled model, every batch size from 1 to MAX_BATCH is run: the micro-batcher can
+        produce any of them, and each new shape triggers CUDA graph capture and cuDNN autotuning.
+        Uncompiled GPU models only need one batch for CUDA context and cuDNN setup;
+        CPU models (including INT8) have nothing to warm up.
+        """
+        if self.device.type != "cuda":
+            return
+        print("Warming up cleaning model...")
+        dummy_image = np.zeros((256, 256, 3), dtype=np.uint8)
+        batch_sizes = range(1, MAX_BATCH + 1) if self.compiled else [1]
+        for batch_size in batch_sizes:
+            self.clean_batch([dummy_image] * batch_size)
+        print("Warmup complete.")
 
     def clean(self, input_image: Image.Image) -> Image.Image:
         """
@@ -77,20 +228,39 @@ class SignatureCleaner:
         Returns:
             PIL.Image: A PIL Image of the cleaned signature.
         """
-        # Ensure image is RGB and resized to 256x256
-        input_image = input_image.convert("RGB").resize((256, 256))
+        return self.clean_batch([input_image])[0]
+
+    def clean_batch(self, images: list[Image.Image | np.ndarray]) -> list[Image.Image]:
+        """
+        Cleans a batch of signature images, running up to MAX_BATCH images per forward pass.
+        Args:
+            images (list[PIL.Image | np.ndarray]): The dirty signatures, as PIL Images or HxWx3 uint8 arrays.
+        Returns:
+            list[PIL.Image]: The cleaned signatures, in the same order as the input.
+        """
+        cleaned_images = []
+        with self._lock:
+            for start in range(0, len(images), MAX_BATCH):
+                input_tensor = self._preprocess(images[start:start + MAX_BATCH])
 
-        # Apply transformations and add batch dimension
-        input_tensor = self.transform(input_image).unsqueeze(0).to(self.device)
+                # Run inference
+                with torch.inference_mode():
+                    if self.trt_runner is not None:
+                        output_tensor = self.trt_runner(input_tensor)
+                    else:
+                        output_tensor = self.model(input_tensor)
 
-        # Run inference
-        with torch.no_grad():
-            output_tensor = self.model(input_tensor)
+                output_tensor = self._tensor_to_uint8(output_tensor)
 
-        # Convert output tensor back to a PIL image
-        cleaned_image = self._tensor_to_pil(output_tensor)
-        
-        return cleaned_image
+                # Bring the batch back into pinned host memory before the buffers are reused
+                if self._h_out is not None:
+                    output_tensor = self._h_out[:len(output_tensor)].copy_(output_tensor, non_blocking=True)
+                    torch.cuda.current_stream(self.device).synchronize()
+
+                # Slice the uint8 batch into PIL images on the CPU
+                cleaned_images.extend(Image.fromarray(arr, "RGB") for arr in output_tensor.numpy())
+
+        return cleaned_images
 
 # --- Example Usage (demonstrates how to use the class) ---
 if __name__ == '__main__':
@@ -2,19 +2,43 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
 
 from .models import CleanRequest, CleanResponse, MatchRequest, MatchResponse, ImagePayload
-from .utils import base64_to_image, image_to_base64, timer, placeholder_clean_image, placeholder_match_images
-from .model_loader import cleaning_model, matching_model
+from .utils import (
+    base64_to_image, decode_and_resize, array_to_base64, timer,
+    placeholder_clean_image, placeholder_match_images,
+)
+from .model_loader import load_models, get_cleaning_model, get_matching_model
+from .batcher import MicroBatcher
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="Signature Verification API",
     description="A backend service to clean and verify signatures using ML models.",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes the large base64 payloads much faster than the stdlib encoder
+    default_response_class=ORJSONResponse,
 )
 
+# --- Image Codec Workers ---
+# Base64 and PNG/JPEG decode/encode are CPU-bound and hold the GIL, so they run in worker processes.
+# Created at startup and shut down with the app, so the app can be started more than once per process.
+executor = None
+
+# --- Micro-Batching ---
+# Images from concurrent /clean requests are grouped into shared model batches.
+# Created at startup, once the cleaning model is loaded.
+batcher = None
+
 # --- CORS Middleware ---
 # This allows the frontend (running on a different domain/port) to communicate with the backend.
 app.add_middleware(
@@ -30,12 +54,32 @@ app.add_middleware(
 async def startup_event():
     """
     Code to run on application startup.
-    Models are loaded via import from model_loader.
+    Models are loaded and warmed up off the event loop before serving traffic.
     """
+    global batcher, executor
+    # "spawn" keeps the workers from inheriting the parent's torch/CUDA state.
+    executor = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+    # Load environment variables from .env file, unless the environment is already fully configured
+    if not os.getenv("NO_DOTENV"):
+        load_dotenv()
+
+    await asyncio.to_thread(load_models)
+
+    cleaning_model = get_cleaning_model()
+    if cleaning_model is not None:
+        batcher = MicroBatcher(cleaning_model.clean_batch)
+        batcher.start()
+        # Warm up on the batcher's thread, where the compiled CUDA graphs will be replayed
+        await batcher.run(cleaning_model.warmup)
+
     print("Application startup complete.")
     if cleaning_model is None:
         print("WARNING: Running in cleaning model bypass mode.")
-    if matching_model is None:
+    if get_matching_model() is None:
         print("WARNING: Running in matching model bypass mode.")
 
 @app.on_event("shutdown")
@@ -43,7 +87,14 @@ async def shutdown_event():
     """
     Code to run on application shutdown.
     """
+    global batcher, executor
     print("Application shutting down.")
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
 
 
 # --- API Endpoints ---
@@ -61,32 +112,52 @@ async def clean_signatures(request: CleanRequest):
     - **Input**: A JSON object with a list of images, each with an ID and base64 data.
     - **Output**: A JSON object with a list of cleaned images and processing times.
     """
+    if executor is None:
+        raise HTTPException(status_code=503, detail="Service is not ready: the application startup event has not run.")
+
     processing_times = {}
-    
-    async def process_single_image(img_payload: ImagePayload):
-        """Asynchronously processes one image."""
-        try:
-            with timer(f"Image ID {img_payload.id} cleaning", processing_times, img_payload.id):
-                input_image = base64_to_image(img_payload.data)
+    loop = asyncio.get_running_loop()
+    cleaning_model = get_cleaning_model()
+    if cleaning_model is not None and batcher is None:
+        raise HTTPException(status_code=503, detail="Service is not ready: the cleaning model is loaded but the micro-batcher was never started.")
 
+    with timer("Total cleaning time for all images", processing_times, "total"):
+        # Decode every image in parallel worker processes, resizing to the model's input size.
+        # Bypass mode passes images through untouched, so it keeps the original resolution.
+        size = (256, 256) if cleaning_model is not None else None
+        decoded = await asyncio.gather(
+            *[loop.run_in_executor(executor, decode_and_resize, img_payload.data, size) for img_payload in request.images],
+            return_exceptions=True,
+        )
+        for img_payload, result in zip(request.images, decoded):
+            if isinstance(result, Exception):
+                print(f"Error decoding image {img_payload.id}: {result}")
+                raise HTTPException(status_code=500, detail=f"Failed to decode image {img_payload.id}: {str(result)}")
+
+        try:
+            # clean_batch syncs its stream before returning, so this covers kernel execution too
+            with timer("Batch cleaning", processing_times, "cleaning"):
                 if cleaning_model is None:
-                    # Bypass mode: return the original image
-                    cleaned_image = placeholder_clean_image(input_image)
+                    # Bypass mode: return the original images
+                    cleaned_images = await asyncio.gather(
+                        *[placeholder_clean_image(Image.fromarray(arr)) for arr in decoded]
+                    )
                 else:
-                    cleaned_image = cleaning_model.clean(input_image)
-
-                cleaned_base64 = image_to_base64(cleaned_image)
-                return ImagePayload(id=img_payload.id, data=cleaned_base64)
-                
+                    # Queue the images for the shared micro-batcher, which batches across requests
+                    cleaned_images = await asyncio.gather(*[batcher.submit(arr) for arr in decoded])
         except Exception as e:
-            # Log the error and decide how to handle it. 
-            # Here, we'll raise an HTTPException to inform the client.
-            print(f"Error processing image {img_payload.id}: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to process image {img_payload.id}: {str(e)}")
+            # Log the error and raise an HTTPException to inform the client.
+            print(f"Error cleaning images: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to clean images: {str(e)}")
 
-    with timer("Total cleaning time for all images", processing_times, "total"):
-        tasks = [process_single_image(img) for img in request.images]
-        cleaned_image_payloads = await asyncio.gather(*tasks)
+        # Encode the results in the worker processes as well
+        encoded = await asyncio.gather(
+            *[loop.run_in_executor(executor, array_to_base64, np.asarray(img)) for img in cleaned_images]
+        )
+        cleaned_image_payloads = [
+            ImagePayload(id=img_payload.id, data=cleaned_base64)
+            for img_payload, cleaned_base64 in zip(request.images, encoded)
+        ]
 
     return CleanResponse(cleaned_images=cleaned_image_payloads, processing_times=processing_times)
 
@@ -99,6 +170,7 @@ async def match_signatures(request: MatchRequest):
     - **Output**: A JSON object with match status, similarity score, and processing time.
     """
     processing_times = {}
+    matching_model = get_matching_model()
     try:
         with timer("Total matching time", processing_times, "total"):
             img1 = base64_to_image(request.image1.data)
@@ -106,14 +178,14 @@ async def match_signatures(request: MatchRequest):
 
             if matching_model is None:
                 # Bypass mode: return random result
-                match_status, score = placeholder_match_images(img1, img2)
+                match_status, score = await placeholder_match_images(img1, img2)
             else:
                 # Real model inference would go here
                 # Example:
                 # score = matching_model(transform(img1), transform(img2))
                 # match_status = "match" if score > THRESHOLD else "no match"
                 # For now, we use the placeholder
-                match_status, score = placeholder_match_images(img1, img2)
+                match_status, score = await placeholder_match_images(img1, img2)
 
         return MatchResponse(
             match=match_status, 
@@ -2,13 +2,23 @@
 
 import torch
 import os
-from dotenv import load_dotenv
+import threading
 from .cleaner import SignatureCleaner
 
-# Load environment variables from .env file
-load_dotenv()
+def _bypass() -> bool:
+    """
+    Reads MODEL_ERROR_BYPASS_FLAG from the environment at call time, so the .env file
+    (loaded in main.py's startup event) and test overrides are always honored.
+    """
+    return os.getenv("MODEL_ERROR_BYPASS_FLAG", "False").lower() == "true"
 
-MODEL_ERROR_BYPASS_FLAG = os.getenv("MODEL_ERROR_BYPASS_FLAG", "False").lower() == "true"
+def _cleaning_gpu_id() -> int:
+    """Reads CLEANING_GPU_ID from the environment at call time. -1 (the default) runs on CPU."""
+    return int(os.getenv("CLEANING_GPU_ID", "-1"))
+
+def _use_trt() -> bool:
+    """Reads USE_TRT from the environment at call time. Only takes effect on GPU."""
+    return os.getenv("USE_TRT", "False").lower() == "true"
 
 # Define the correct path to your trained model
 CLEANING_MODEL_PATH = "checkpoints/latest_net_G.pth"
@@ -21,19 +31,19 @@ def load_cleaning_model(path: str):
     print("Attempting to load signature cleaning model...")
     if not os.path.exists(path):
         print(f"ERROR: Cleaning model not found at {path}")
-        if MODEL_ERROR_BYPASS_FLAG:
+        if _bypass():
             print("MODEL_ERROR_BYPASS_FLAG is True. Proceeding with placeholder functionality.")
             return None
         raise FileNotFoundError(f"Cleaning model not found at {path}")
     
     try:
         # Use the SignatureCleaner class to load the real model
-        model = SignatureCleaner(path, gpu_id=-1) # Use gpu_id=0 for GPU
+        model = SignatureCleaner(path, gpu_id=_cleaning_gpu_id(), use_trt=_use_trt())
         print("Signature cleaning model loaded successfully.")
         return model
     except Exception as e:
         print(f"ERROR: Failed to load cleaning model from {path}. Error: {e}")
-        if MODEL_ERROR_BYPASS_FLAG:
+        if _bypass():
             print("MODEL_ERROR_BYPASS_FLAG is True. Proceeding with placeholder functionality.")
             return None
         raise e
@@ -47,7 +57,7 @@ def load_matching_model(path: str):
     print("Attempting to load signature matching model...")
     if not os.path.exists(path):
         print(f"ERROR: Matching model not found at {path}")
-        if MODEL_ERROR_BYPASS_FLAG:
+        if _bypass():
             print("MODEL_ERROR_BYPASS_FLAG is True. Proceeding with placeholder functionality.")
             return None
         raise FileNotFoundError(f"Matching model not found at {path}")
@@ -62,7 +72,7 @@ def load_matching_model(path: str):
         return model
     except Exception as e:
         print(f"ERROR: Failed to load matching model from {path}. Error: {e}")
-        if MODEL_ERROR_BYPASS_FLAG:
+        if _bypass():
             print("MODEL_ERROR_BYPASS_FLAG is True. Proceeding with placeholder functionality.")
             return None
         raise e
@@ -71,8 +81,32 @@ def load_matching_model(path: str):
 CLEANING_MODEL_PATH = "models_weights/pix2pix_model.pth"
 MATCHING_MODEL_PATH = "models_weights/siamese_transformer.pth"
 
-# --- Load Models on Startup ---
-# These will be imported into main.py
-cleaning_model = load_cleaning_model(CLEANING_MODEL_PATH)
-matching_model = load_matching_model(MATCHING_MODEL_PATH)
+# --- Lazy Model Loading ---
+# Models are loaded on first use (normally from main.py's startup event) rather than at import time.
+_models_lock = threading.Lock()
+_models_loaded = False
+_cleaning_model = None
+_matching_model = None
+
+def load_models():
+    """
+    Loads both models exactly once. Safe to call from multiple threads.
+    The cleaning model is warmed up separately, on the thread that will serve it (see main.py).
+    """
+    global _models_loaded, _cleaning_model, _matching_model
+    with _models_lock:
+        if _models_loaded:
+            return
+        _cleaning_model = load_cleaning_model(CLEANING_MODEL_PATH)
+        _matching_model = load_matching_model(MATCHING_MODEL_PATH)
+        _models_loaded = True
+
+def get_cleaning_model():
+    """Returns the cleaning model, loading it if necessary. None in bypass mode."""
+    load_models()
+    return _cleaning_model
 
+def get_matching_model():
+    """Returns the matching model, loading it if necessary. None in bypass mode."""
+    load_models()
+    return _matching_model
@@ -1,7 +1,7 @@
 # app/models.py
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class ImagePayload(BaseModel):
     """
@@ -20,10 +20,10 @@ class CleanRequest(BaseModel):
 class CleanResponse(BaseModel):
     """
     Response model for the /clean endpoint.
-    Returns a list of cleaned images.
+    Returns a list of cleaned images as base64 JPEG data URLs (quality 90).
     """
     cleaned_images: List[ImagePayload]
-    processing_times: dict
+    processing_times: Dict[str, float]
 
 class MatchRequest(BaseModel):
     """
@@ -0,0 +1,120 @@
+# app/trt_backend.py
+
+import os
+import shutil
+import subprocess
+
+import torch
+
+# TensorRT is an optional dependency; the cleaner falls back to PyTorch without it.
+try:
+    import tensorrt as trt
+except ImportError:
+    trt = None
+
+
+def export_onnx(model: torch.nn.Module, onnx_path: str, device: torch.device):
+    """
+    Exports the generator to ONNX with a dynamic batch dimension.
+    """
+    # Unwrap DataParallel, which the ONNX exporter cannot trace through.
+    model = getattr(model, "module", model)
+    dummy_input = torch.randn(1, 3, 256, 256, device=device)
+    torch.onnx.export(
+        model,
+        dummy_input,
+        onnx_path,
+        opset_version=17,
+        input_names=["x"],
+        output_names=["y"],
+        dynamic_axes={"x": {0: "batch"}, "y": {0: "batch"}},
+    )
+
+
+def build_engine(onnx_path: str, engine_path: str, max_batch: int):
+    """
+    Builds an FP16 TensorRT engine from an ONNX file using trtexec.
+    """
+    trtexec = shutil.which("trtexec")
+    if trtexec is None:
+        raise RuntimeError("trtexec not found on PATH; cannot build TensorRT engine.")
+
+    opt_batch = max(1, max_batch // 2)
+    subprocess.run([
+        trtexec,
+        f"--onnx={onnx_path}",
+        "--fp16",
+        f"--saveEngine={engine_path}",
+        "--minShapes=x:1x3x256x256",
+        f"--optShapes=x:{opt_batch}x3x256x256",
+        f"--maxShapes=x:{max_batch}x3x256x256",
+    ], check=True)
+
+
+class TRTRunner:
+    """Runs a serialized TensorRT engine of the generator on preallocated device buffers."""
+
+    def __init__(self, engine_path: str, device: torch.device, max_batch: int):
+        """
+        Initializes the TRTRunner.
+        Args:
+            engine_path (str): Path to the serialized TensorRT engine (.plan).
+            device (torch.device): CUDA device the engine runs on.
+            max_batch (int): Largest batch size the engine was built for.
+        """
+        if trt is None:
+            raise ImportError("tensorrt is not installed.")
+
+        self.device = device
+        self.max_batch = max_batch
+
+        logger = trt.Logger(trt.Logger.WARNING)
+        runtime = trt.Runtime(logger)
+        with open(engine_path, "rb") as f:
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        if self.engine is None:
+            raise RuntimeError(f"Failed to deserialize TensorRT engine at {engine_path}")
+        self.context = self.engine.create_execution_context()
+
+        # Device buffers are allocated once and reused for every batch.
+        self._input = torch.empty(max_batch, 3, 256, 256, dtype=torch.float32, device=device)
+        self._output = torch.empty(max_batch, 3, 256, 256, dtype=torch.float32, device=device)
+        self.context.set_tensor_address("x", self._input.data_ptr())
+        self.context.set_tensor_address("y", self._output.data_ptr())
+
+    def __call__(self, input_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Runs the engine on a [N, 3, 256, 256] batch with N <= max_batch.
+        The returned tensor is a view into the runner's output buffer and is
+        overwritten by the next call.
+        """
+        n = input_tensor.shape[0]
+        self._input[:n].copy_(input_tensor, non_blocking=True)
+        self.context.set_input_shape("x", (n, 3, 256, 256))
+
+        stream = torch.cuda.current_stream(self.device)
+        if not self.context.execute_async_v3(stream.cuda_stream):
+            raise RuntimeError("TensorRT inference failed.")
+        return self._output[:n]
+
+
+def load_trt_runner(model: torch.nn.Module, checkpoint_path: str, device: torch.device, max_batch: int) -> TRTRunner:
+    """
+    Returns a TRTRunner for the generator, exporting to ONNX and building the
+    engine next to the checkpoint on first use.
+    """
+    if trt is None:
+        raise ImportError("tensorrt is not installed.")
+
+    base_path = os.path.splitext(checkpoint_path)[0]
+    onnx_path = base_path + ".onnx"
+    # The engine's optimization profile caps the batch size, so a different MAX_BATCH needs its own engine.
+    engine_path = f"{base_path}.b{max_batch}.plan"
+
+    # Rebuild whenever the checkpoint is newer than the cached engine.
+    if not os.path.exists(engine_path) or os.path.getmtime(engine_path) < os.path.getmtime(checkpoint_path):
+        print(f"Building TensorRT FP16 engine at {engine_path}")
+        export_onnx(model, onnx_path, device)
+        build_engine(onnx_path, engine_path, max_batch)
+
+    return TRTRunner(engine_path, device, max_batch)
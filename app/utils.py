@@ -1,11 +1,13 @@
 # app/utils.py
 
-import base64
+import pybase64 as base64
 import numpy as np
 from PIL import Image
 import io
 import time
+import asyncio
 from contextlib import contextmanager
+from typing import Optional
 
 def base64_to_image(base64_string: str) -> Image.Image:
     """
@@ -13,41 +15,78 @@ def base64_to_image(base64_string: str) -> Image.Image:
     Handles strings with or without the 'data:image/...' prefix.
     """
     # Remove the header if it exists
-    if "," in base64_string:
-        header, encoded_data = base64_string.split(",", 1)
-    else:
-        encoded_data = base64_string
+    header, sep, encoded_data = base64_string.partition(",")
+    if not sep:
+        encoded_data = header
 
-    # Decode the base64 string
-    image_data = base64.b64decode(encoded_data)
+    # Decode the base64 string (pybase64 uses SIMD decoding when available)
+    image_data = base64.b64decode(encoded_data, validate=False)
     
     # Open the image using Pillow
     image = Image.open(io.BytesIO(image_data))
     return image
 
-def image_to_base64(image: Image.Image, format: str = "PNG") -> str:
+def image_to_base64(image: Image.Image, format: str = "JPEG", quality: int = 90) -> str:
     """
     Encodes a PIL Image into a base64 string.
+    Defaults to JPEG, which is much smaller and faster to encode than PNG.
+    Use format="WEBP" if alpha needs to be preserved.
     """
+    format = format.upper()
+    if format == "JPEG":
+        # JPEG has no alpha channel or palette support. Flatten transparency onto white,
+        # like a signature on paper, instead of exposing whatever colour sits under the alpha.
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        save_kwargs = {"quality": quality, "optimize": False, "subsampling": 2}
+    elif format == "WEBP":
+        save_kwargs = {"quality": quality, "method": 4}
+    else:
+        save_kwargs = {}
+
     buffered = io.BytesIO()
-    image.save(buffered, format=format)
+    image.save(buffered, format=format, **save_kwargs)
     img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
     return f"data:image/{format.lower()};base64,{img_str}"
 
+def decode_and_resize(base64_string: str, size: Optional[tuple[int, int]] = (256, 256)) -> np.ndarray:
+    """
+    Decodes a base64 string into a uint8 array, converted to RGB and resized to the given size.
+    Pass size=None to keep the original resolution and mode, including any alpha channel.
+    Meant to run in a worker process: the returned array is cheap to pickle.
+    """
+    image = base64_to_image(base64_string)
+    if size is not None:
+        image = image.convert("RGB").resize(size)
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        # Expand palette and other modes so the array carries the actual pixel values
+        image = image.convert("RGBA")
+    return np.asarray(image)
+
+def array_to_base64(array: np.ndarray, format: str = "JPEG", quality: int = 90) -> str:
+    """
+    Encodes a uint8 image array (RGB, RGBA, L or LA) into a base64 string.
+    Meant to run in a worker process, mirroring decode_and_resize.
+    """
+    return image_to_base64(Image.fromarray(array), format=format, quality=quality)
+
 @contextmanager
 def timer(description: str, times_dict: dict, key: str):
     """
     A context manager to time a block of code and store the result in a dictionary.
     """
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     yield
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+    elapsed_time = (time.perf_counter_ns() - start_time) / 1e9
     times_dict[key] = elapsed_time
     print(f"{description} took: {elapsed_time:.4f} seconds")
 
 # Example of a placeholder function for model inference
-def placeholder_clean_image(image: Image.Image) -> Image.Image:
+async def placeholder_clean_image(image: Image.Image) -> Image.Image:
     """
     Placeholder function to "clean" an image.
     In bypass mode, this simply returns the original image.
@@ -55,17 +94,17 @@ def placeholder_clean_image(image: Image.Image) -> Image.Image:
     # In a real scenario, you would apply your CycleGAN model here.
     # For example: cleaned_tensor = cyclegan_model(transform(image))
     # cleaned_image = to_pil_image(cleaned_tensor)
-    time.sleep(0.5) # Simulate processing time
+    await asyncio.sleep(0.5) # Simulate processing time without blocking the event loop
     return image
 
-def placeholder_match_images(image1: Image.Image, image2: Image.Image) -> tuple[str, float]:
+async def placeholder_match_images(image1: Image.Image, image2: Image.Image) -> tuple[str, float]:
     """
     Placeholder function to "match" two images.
     In bypass mode, this generates a random result.
     """
     # In a real scenario, you would use your Siamese-Transformer model here.
     # For example: score = siamese_model(transform(image1), transform(image2))
-    time.sleep(0.2) # Simulate processing time
+    await asyncio.sleep(0.2) # Simulate processing time without blocking the event loop
     score = np.random.rand()
     match_status = "match" if score > 0.6 else "no match"
     return match_status, float(score)
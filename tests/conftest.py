@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Make the `app` package importable when pytest is run from anywhere in the repo
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
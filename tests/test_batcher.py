@@ -0,0 +1,101 @@
+# tests/test_batcher.py
+
+import asyncio
+import threading
+
+from app.batcher import MicroBatcher
+
+
+class RecordingProcessor:
+    """Stub process_batch that records each batch it is given and multiplies items by 10."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, items: list) -> list:
+        self.calls.append(list(items))
+        return [item * 10 for item in items]
+
+
+def test_concurrent_submits_share_one_batch():
+    """Items submitted together are processed in a single call, with results in submission order."""
+    process_batch = RecordingProcessor()
+
+    async def scenario():
+        batcher = MicroBatcher(process_batch, max_batch=16, max_wait_ms=50)
+        batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(scenario()) == [0, 10, 20, 30, 40]
+    assert process_batch.calls == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_are_capped_at_max_batch():
+    """More items than max_batch are split across calls, and every result still lands in order."""
+    process_batch = RecordingProcessor()
+
+    async def scenario():
+        batcher = MicroBatcher(process_batch, max_batch=4, max_wait_ms=50)
+        batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(scenario()) == [i * 10 for i in range(10)]
+    assert [len(call) for call in process_batch.calls] == [4, 4, 2]
+    assert [item for call in process_batch.calls for item in call] == list(range(10))
+
+
+def test_exception_reaches_every_waiting_submitter():
+    """If process_batch raises, each request in that batch gets the exception."""
+    def failing_batch(items: list) -> list:
+        raise ValueError("model exploded")
+
+    async def scenario():
+        batcher = MicroBatcher(failing_batch, max_batch=16, max_wait_ms=50)
+        batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(scenario())
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) and str(result) == "model exploded" for result in results)
+
+
+def test_cancelled_submitter_is_skipped():
+    """An item whose submitter was cancelled while queued never reaches process_batch."""
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def blocking_batch(items: list) -> list:
+        calls.append(list(items))
+        started.set()
+        release.wait(5)
+        return items
+
+    async def scenario():
+        batcher = MicroBatcher(blocking_batch, max_batch=1, max_wait_ms=0)
+        batcher.start()
+        try:
+            # Hold the worker busy on "a" so "b" and "c" wait in the queue
+            first = asyncio.create_task(batcher.submit("a"))
+            assert await asyncio.to_thread(started.wait, 5)
+            second = asyncio.create_task(batcher.submit("b"))
+            third = asyncio.create_task(batcher.submit("c"))
+            await asyncio.sleep(0)
+
+            second.cancel()
+            release.set()
+            return await asyncio.gather(first, third)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(scenario()) == ["a", "c"]
+    assert calls == [["a"], ["c"]]
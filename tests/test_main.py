@@ -0,0 +1,44 @@
+# tests/test_main.py
+
+import io
+
+import pybase64 as base64
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.utils import base64_to_image
+
+
+def _encode_png(image: Image.Image) -> str:
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def test_clean_bypass_mode(monkeypatch):
+    """/clean passes images through at their original size when running without model weights."""
+    monkeypatch.setenv("NO_DOTENV", "1")
+    monkeypatch.setenv("MODEL_ERROR_BYPASS_FLAG", "True")
+
+    payload = {
+        "images": [
+            {"id": "a", "data": _encode_png(Image.new("RGB", (300, 200), color="white"))},
+            {"id": "b", "data": _encode_png(Image.new("RGB", (64, 64), color="black"))},
+            {"id": "c", "data": _encode_png(Image.new("RGBA", (40, 30), color=(0, 0, 0, 0)))},
+        ]
+    }
+
+    # Entering the client runs the startup event, which loads the models in bypass mode
+    with TestClient(app) as client:
+        response = client.post("/clean", json=payload)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [img["id"] for img in body["cleaned_images"]] == ["a", "b", "c"]
+    assert all(img["data"].startswith("data:image/jpeg;base64,") for img in body["cleaned_images"])
+    assert set(body["processing_times"]) == {"cleaning", "total"}
+    outputs = [base64_to_image(img["data"]) for img in body["cleaned_images"]]
+    assert [img.size for img in outputs] == [(300, 200), (64, 64), (40, 30)]
+    # Transparent areas are flattened onto white rather than the black under the alpha
+    assert outputs[2].convert("L").getpixel((0, 0)) > 250
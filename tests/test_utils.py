@@ -0,0 +1,48 @@
+# tests/test_utils.py
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.utils import array_to_base64, base64_to_image, image_to_base64
+
+
+def _sample_images() -> dict[str, Image.Image]:
+    rgba = Image.new("RGBA", (48, 32), color=(0, 0, 0, 0))
+    rgba.paste((20, 20, 20, 255), (8, 8, 40, 24))
+    grayscale = Image.new("L", (48, 32), color=255)
+    grayscale.paste(0, (8, 8, 40, 24))
+    return {"RGBA": rgba, "L": grayscale}
+
+
+@pytest.mark.parametrize("format", ["JPEG", "WEBP"])
+@pytest.mark.parametrize("mode", ["RGBA", "L"])
+def test_image_to_base64_round_trip(mode, format):
+    """PIL images of any mode encode to a data URL of the requested format and decode back intact."""
+    image = _sample_images()[mode]
+
+    encoded = image_to_base64(image, format=format)
+
+    assert encoded.startswith(f"data:image/{format.lower()};base64,")
+    decoded = base64_to_image(encoded)
+    assert decoded.format == format
+    assert decoded.size == image.size
+    # Dark ink stays dark and the background stays light (transparent areas become white in JPEG)
+    assert decoded.convert("L").getpixel((24, 16)) < 64
+    if mode == "L" or format == "JPEG":
+        assert decoded.convert("L").getpixel((2, 2)) > 192
+
+
+@pytest.mark.parametrize("format", ["JPEG", "WEBP"])
+@pytest.mark.parametrize("mode", ["RGBA", "L"])
+def test_array_to_base64_round_trip(mode, format):
+    """uint8 arrays from the decode workers encode the same way as the PIL images they came from."""
+    array = np.asarray(_sample_images()[mode])
+
+    encoded = array_to_base64(array, format=format)
+
+    assert encoded.startswith(f"data:image/{format.lower()};base64,")
+    decoded = base64_to_image(encoded)
+    assert decoded.format == format
+    assert decoded.size == (array.shape[1], array.shape[0])
+    assert decoded.convert("L").getpixel((24, 16)) < 64